@@ -1,16 +1,29 @@
 import os
+import re
+import hashlib
 import time
 import math
 import logging
 from datetime import datetime
+from email.utils import formatdate
+from functools import partial
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 import requests
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Any, Callable, Iterator, List, Dict, Optional, Tuple, Union
 from dog_cache import DogCache
 from background_jobs import scheduler
 
+try:
+    import orjson
+except ImportError:  # optional, responses fall back to flask's json encoder
+    orjson = None
+
 app = Flask(__name__)
+app.json.sort_keys = False
 CORS(app)
 
 # Configure logging
@@ -27,43 +40,73 @@ logger = logging.getLogger(__name__)
 # Configuration
 EXTERNAL_API_BASE = "https://interview-api-olive.vercel.app/api/dogs"
 ITEMS_PER_PAGE = 15  # Standard pagination: 15 items per page
-MAX_RETRIES = 3
-RETRY_DELAY = 1  # seconds
+MAX_RETRIES = 3  # attempts per external page
+RETRY_DELAY = 1  # backoff factor: first retry is immediate, then 2s, 4s, ... (urllib3 2.x)
 MAX_EXTERNAL_PAGES = 50  # Limit external page fetching to prevent infinite loops
 CACHE_REFRESH_INTERVAL = 600  # 10 minutes - periodic full refresh to detect inconsistent data
+FETCH_WORKERS = 8  # external pages fetched in parallel
+REFRESH_UNCHANGED_PAGE_LIMIT = 3  # periodic refresh stops after this many unchanged pages in a row
+
+# breed names that contain a URL or an image filename are corrupted records
+_CORRUPT_BREED_RE = re.compile(r'https?://|\.(?:jpe?g|png|gif|webp)', re.IGNORECASE)
+
+# shared session so parallel page fetches reuse pooled keep-alive connections;
+# the adapter retries connection errors and the error statuses the API is known
+# to return at random, with exponential backoff. Retry-After is only honoured
+# for 413/429/503 (urllib3's RETRY_AFTER_STATUS_CODES)
+RETRY_POLICY = Retry(
+    total=MAX_RETRIES - 1,
+    backoff_factor=RETRY_DELAY,
+    status_forcelist=(400, 403, 429, 500, 502, 503, 504),
+    allowed_methods={"GET"}
+)
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=FETCH_WORKERS, pool_maxsize=2 * FETCH_WORKERS, max_retries=RETRY_POLICY))
 
 # Initialize SQLite cache (persistent storage across restarts)
 db_cache = DogCache('dogs_cache.db')
 last_fetch_time = None
+# True once a fetch has walked every page from page 1 without a failed page;
+# periodic refreshes may only stop early while this holds
+last_fetch_complete = False
+# when the last pass over every page started (not when it finished), so pages
+# changed upstream while it was running are not reported as unmodified later
+last_full_pass_started_at = None
+SERVER_STARTED_AT = time.time()
+
+# fetch_with_retry result for a 304: the page exists but hasn't changed
+NOT_MODIFIED = object()
 
 
-def fetch_with_retry(page: int) -> Optional[List[Dict]]:
+def fetch_with_retry(page: int, if_modified_since: Optional[str] = None) -> Union[List[Dict], object, None]:
     
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            url = f"{EXTERNAL_API_BASE}?page={page}"
-            logger.info(f"Fetching from external API: {url} (attempt: {attempt})")
-            
-            response = requests.get(url, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if isinstance(data, list):
-                    logger.info(f"Successfully fetched {len(data)} items from external page {page}")
-                    return data
-                else:
-                    logger.warning(f"Invalid data format from API for page {page}")
-            else:
-                logger.warning(f"API returned status code {response.status_code} for page {page}")
-                
-        except Exception as e:
-            logger.error(f"error for external page {page}: {str(e)}")
+    url = f"{EXTERNAL_API_BASE}?page={page}"
+    headers = {"If-Modified-Since": if_modified_since} if if_modified_since else None
+    
+    try:
+        logger.info(f"Fetching from external API: {url}")
+        
+        # retries and backoff happen inside SESSION (see RETRY_POLICY)
+        response = SESSION.get(url, timeout=10, headers=headers)
+        
+        if response.status_code == 304:
+            logger.info(f"External page {page} not modified since {if_modified_since}")
+            return NOT_MODIFIED
         
-        if attempt < MAX_RETRIES:
-            delay = RETRY_DELAY * (2 ** (attempt - 1))
-            time.sleep(delay)
+        if response.status_code == 200:
+            data = response.json()
+            if isinstance(data, list):
+                logger.info(f"Successfully fetched {len(data)} items from external page {page}")
+                return data
+            else:
+                logger.warning(f"Invalid data format from API for page {page}")
+        else:
+            logger.warning(f"API returned status code {response.status_code} for page {page}")
+            
+    except Exception as e:
+        logger.error(f"error for external page {page}: {str(e)}")
     
-    logger.error(f"Failed to fetch external page {page} after {MAX_RETRIES} attempts")
+    logger.error(f"Failed to fetch external page {page}")
     return None
 
 
@@ -74,16 +117,17 @@ def validate_and_normalize_dog_data(data: Dict) -> Optional[Dict]:
     breed = data.get("breed")
     image = data.get("image")
     
+    if isinstance(breed, str):
+        breed = breed.strip()
+    
     # Validate required field: breed must exist
-    if not breed or not isinstance(breed, str) or len(breed.strip()) == 0:
+    if not breed or not isinstance(breed, str):
         logger.warning(f"Skipping dog with missing/invalid breed: {data}")
         return None
     
-    breed = breed.strip()
-    
-    # Check for breed names (too long, contains URLs, or has image extensions)
-    if (len(breed) > 60 or 'http://' in breed.lower() or 'https://' in breed.lower() or 
-        any(ext in breed.lower() for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp'])):
+    # Check for breed names (too long, contains URLs, or has image extensions);
+    # both patterns need a '.' or '/', so plain names skip the regex entirely
+    if len(breed) > 60 or (('.' in breed or '/' in breed) and _CORRUPT_BREED_RE.search(breed)):
         logger.warning(f"Skipping corrupted breed: {breed[:80]}...")
         return None
     
@@ -100,8 +144,44 @@ def validate_and_normalize_dog_data(data: Dict) -> Optional[Dict]:
     }
 
 
-def fetch_dogs_from_api(start_page: int = 1, max_pages: int = None) -> int:
-    global last_fetch_time
+def fetch_and_validate_page(page: int, if_modified_since: Optional[str] = None) -> Optional[Tuple[Optional[int], List[Dict]]]:
+    # validate in the worker right after the fetch so the raw page is dropped
+    # immediately; returns (items fetched, valid dogs), (None, []) when the page
+    # was not modified, or None on failure
+    external_data = fetch_with_retry(page, if_modified_since)
+    if external_data is None:
+        return None
+    if external_data is NOT_MODIFIED:
+        return None, []
+    
+    validated_dogs = [dog for item in external_data if (dog := validate_and_normalize_dog_data(item))]
+    return len(external_data), validated_dogs
+
+
+def fetch_pages(start_page: int, end_page: int, if_modified_since: Optional[str] = None) -> Iterator[Tuple[int, Optional[Tuple[Optional[int], List[Dict]]]]]:
+    # fetch FETCH_WORKERS pages at a time and yield them in page order, so the
+    # caller can stop early without requesting every remaining page
+    fetch_page = partial(fetch_and_validate_page, if_modified_since=if_modified_since)
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        for wave_start in range(start_page, end_page, FETCH_WORKERS):
+            pages = range(wave_start, min(wave_start + FETCH_WORKERS, end_page))
+            yield from zip(pages, executor.map(fetch_page, pages))
+
+
+def fetch_dogs_from_api(start_page: int = 1, max_pages: int = None, stop_after_unchanged_pages: int = None) -> int:
+    """
+    stop_after_unchanged_pages: stop once this many pages in a row bring no new
+    or changed dogs (used by refreshes). None = fetch every page
+    """
+    global last_fetch_time, last_fetch_complete, last_full_pass_started_at
+    
+    fetch_started_at = time.time()
+    
+    # stopping early would leave pages missed by an earlier fetch missing, so
+    # fall back to a full pass until one has finished without failures
+    if stop_after_unchanged_pages and not last_fetch_complete:
+        logger.info("Previous fetch was incomplete, refreshing every page")
+        stop_after_unchanged_pages = None
     
     if max_pages:
         logger.info(f"Fetching pages {start_page}-{start_page+max_pages-1} from external API")
@@ -109,18 +189,29 @@ def fetch_dogs_from_api(start_page: int = 1, max_pages: int = None) -> int:
         logger.info(f"Fetching all dogs from external API (starting at page {start_page})")
     
     consecutive_failures = 0
-    total_fetched = 0
+    failed_pages = 0
+    unchanged_pages = 0
+    stopped_early = False
+    # keyed by breed: the API repeats breeds across pages, and the last copy
+    # wins just as it would with one upsert per page
+    all_validated: Dict[str, Dict] = {}
     
     if max_pages:
         end_page = min(start_page + max_pages, MAX_EXTERNAL_PAGES + 1)
     else:
         end_page = MAX_EXTERNAL_PAGES + 1
     
-    for external_page in range(start_page, end_page):
-        external_data = fetch_with_retry(external_page)
-        
-        if external_data is None:
+    # refreshes ask the API to skip pages that haven't changed since the last fetch
+    if_modified_since = None
+    if stop_after_unchanged_pages and last_full_pass_started_at:
+        if_modified_since = formatdate(last_full_pass_started_at, usegmt=True)
+    
+    for external_page, page_result in fetch_pages(start_page, end_page, if_modified_since):
+        if page_result is None:
             consecutive_failures += 1
+            failed_pages += 1
+            # a failed page says nothing about whether the data changed
+            unchanged_pages = 0
             logger.warning(f"Skipping page {external_page} due to fetch failure (consecutive: {consecutive_failures})")
             
             # just keep checking until we get the data
@@ -131,34 +222,49 @@ def fetch_dogs_from_api(start_page: int = 1, max_pages: int = None) -> int:
         
         consecutive_failures = 0
         
-        if len(external_data) == 0:
+        fetched_count, validated_dogs = page_result
+        if fetched_count is None:
+            # 304: the page is still there, it just has nothing new
+            logger.info(f"Page {external_page}: Not modified")
+        elif fetched_count == 0:
             logger.info(f"Empty page {external_page}, stopping fetch")
             break
+        else:
+            all_validated.update((dog["breed"], dog) for dog in validated_dogs)
+            logger.info(f"Page {external_page}: Validated {len(validated_dogs)} dogs ({fetched_count} fetched)")
         
-        #validate
-        validated_dogs = []
-        for item in external_data:
-            validated = validate_and_normalize_dog_data(item)
-            if validated:
-                validated_dogs.append(validated)
-        
-        #add it to the cache
-        if validated_dogs:
-            added_count = db_cache.add_dogs_batch(validated_dogs)
-            total_fetched += added_count
-            logger.info(f"Page {external_page}: Processed {len(validated_dogs)} dogs ({len(external_data)} fetched)")
+        if stop_after_unchanged_pages:
+            if db_cache.count_changes(validated_dogs):
+                unchanged_pages = 0
+            else:
+                unchanged_pages += 1
+                if unchanged_pages >= stop_after_unchanged_pages:
+                    logger.info(f"{unchanged_pages} consecutive unchanged pages at page {external_page}, stopping fetch")
+                    stopped_early = True
+                    break
+    
+    #add everything to the cache in one batch (a single transaction)
+    total_fetched = db_cache.add_dogs_batch(list(all_validated.values()))
     
     # Update last fetch time
     last_fetch_time = datetime.now().isoformat()
+    if failed_pages:
+        last_fetch_complete = False
+    elif start_page == 1 and not max_pages:
+        last_fetch_complete = True
+        # pages after an early stop were not checked, so only a full pass
+        # moves the If-Modified-Since baseline forward
+        if not stopped_early:
+            last_full_pass_started_at = fetch_started_at
     
-    total_in_cache = len(db_cache.get_all_dogs_dict())
+    total_in_cache = db_cache.get_count()
     logger.info(f"Fetch complete. Processed {total_fetched} dogs. Total in cache: {total_in_cache}")
     
     return total_fetched
 
 
 def quick_initial_fetch() -> None:
-    total_dogs = len(db_cache.get_all_dogs_dict())
+    total_dogs = db_cache.get_count()
     
     if total_dogs == 0:
         logger.info("🚀 QUICK INITIAL FETCH: Getting first 5 pages for fast startup...")
@@ -168,30 +274,62 @@ def quick_initial_fetch() -> None:
         logger.info(f"Cache has {total_dogs} dogs, skipping initial fetch")
 
 
-def periodic_cache_refresh_job() -> None:
-    dogs_before = len(db_cache.get_all_dogs_dict())
+def refresh_cache(stop_after_unchanged_pages: int = None) -> None:
+    dogs_before = db_cache.get_count()
     logger.info(f"🔄 Refreshing cache (currently {dogs_before} dogs)...")
     
-    fetch_dogs_from_api(start_page=1, max_pages=None)
+    fetch_dogs_from_api(start_page=1, max_pages=None, stop_after_unchanged_pages=stop_after_unchanged_pages)
     
-    dogs_after = len(db_cache.get_all_dogs_dict())
+    dogs_after = db_cache.get_count()
     change = dogs_after - dogs_before
     logger.info(f"✅ Refresh complete: {dogs_after} dogs ({change:+d} change)")
 
 
+def background_full_fetch_job() -> None:
+    # completes the dataset after quick_initial_fetch, so it must not stop
+    # early on the pages that fetch already stored
+    refresh_cache()
+
+
+def periodic_cache_refresh_job() -> None:
+    refresh_cache(stop_after_unchanged_pages=REFRESH_UNCHANGED_PAGE_LIMIT)
+
+
+def make_etag(*parts) -> str:
+    # the cache version restarts at 0 with the process, so mix in the start time
+    key = "|".join(map(str, (SERVER_STARTED_AT, *parts)))
+    return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+def ojsonify(obj: Any, status: int = 200):
+    if orjson is None:
+        response = jsonify(obj)
+        response.status_code = status
+        return response
+    return app.response_class(orjson.dumps(obj), status=status, mimetype="application/json")
+
+
+def conditional_json(etag: str, build_payload: Callable[[], Any]):
+    # answer 304 without building or serialising the payload when the client
+    # already has this version; "no-cache" makes browsers revalidate every time
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = ojsonify(build_payload())
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
 @app.route("/api/dogs", methods=["GET"])
 def get_dogs():
     try:
         page = request.args.get("page", type=int, default=1)
         
-        all_dogs_dict = db_cache.get_all_dogs_dict()
-        all_dogs = [{"breed": breed, "image": image} for breed, image in sorted(all_dogs_dict.items())]
-        
-        start_idx = (page - 1) * ITEMS_PER_PAGE
-        end_idx = start_idx + ITEMS_PER_PAGE
-        page_data = all_dogs[start_idx:end_idx]
+        offset = (page - 1) * ITEMS_PER_PAGE
+        etag = make_etag(db_cache.version, page)
         
-        return jsonify(page_data), 200
+        return conditional_json(etag, lambda: db_cache.get_page(offset, ITEMS_PER_PAGE))
         
     except Exception as e:
         logger.error(f"Error in get_dogs endpoint: {str(e)}")
@@ -200,16 +338,19 @@ def get_dogs():
 
 @app.route("/api/stats", methods=["GET"])
 def get_stats():
-    all_dogs = db_cache.get_all_dogs_dict()
-    total_dogs = len(all_dogs)
-    total_pages = math.ceil(total_dogs / ITEMS_PER_PAGE) if total_dogs > 0 else 0
+    etag = make_etag(db_cache.version, last_fetch_time)
     
-    return jsonify({
-        "total_dogs": total_dogs,
-        "total_pages": total_pages,
-        "items_per_page": ITEMS_PER_PAGE,
-        "last_fetch": last_fetch_time
-    }), 200
+    def build_stats():
+        total_dogs = db_cache.get_count()
+        total_pages = math.ceil(total_dogs / ITEMS_PER_PAGE) if total_dogs > 0 else 0
+        return {
+            "total_dogs": total_dogs,
+            "total_pages": total_pages,
+            "items_per_page": ITEMS_PER_PAGE,
+            "last_fetch": last_fetch_time
+        }
+    
+    return conditional_json(etag, build_stats)
 
 
 if __name__ == "__main__":
@@ -219,16 +360,17 @@ if __name__ == "__main__":
     
     #get the rest of the data with the scheduler
     scheduler.add_job(
-        func=periodic_cache_refresh_job,
+        func=background_full_fetch_job,
         interval_seconds=None,
         name="background_full_fetch"
     )
     
-    #scheduler runs every 10 minutes
+    #scheduler runs every 10 minutes, starting after the full fetch has had its turn
     scheduler.add_job(
         func=periodic_cache_refresh_job,
         interval_seconds=CACHE_REFRESH_INTERVAL,
-        name="periodic_cache_refresh"
+        name="periodic_cache_refresh",
+        run_on_start=False
     )
     
     scheduler.start()
@@ -15,21 +15,26 @@ class BackgroundJobScheduler:
         self.jobs = []
         self.running = False
         self.thread = None
+        # set by add_job() and stop() to wake the loop early
+        self._wake_event = threading.Event()
     
-    def add_job(self, func: Callable, interval_seconds: int =None, name: str = None):
+    def add_job(self, func: Callable, interval_seconds: int =None, name: str = None, run_on_start: bool = True):
         """
         func: Function to run
         interval_seconds: How often to run (in seconds). None = run once on startup
         name: Job name for logging
+        run_on_start: Periodic jobs only. False = first run one interval from now
         """
         job = {
             'func': func,
             'interval': interval_seconds,
             'name': name or func.__name__,
-            'last_run': 0,
-            'run_once': interval_seconds is None
+            'last_run': 0 if run_on_start else time.time(),
+            'run_once': interval_seconds is None,
+            'is_running': False
         }
         self.jobs.append(job)
+        self._wake_event.set()
         if interval_seconds is None:
             logger.info(f"Scheduled job '{job['name']}' to run once on startup")
         else:
@@ -45,37 +50,61 @@ class BackgroundJobScheduler:
         self.thread.start()
         logger.info("Background job scheduler started")
     
+    def _run_job(self, job):
+        kind = "one-time job" if job['run_once'] else "background job"
+        try:
+            logger.info(f"Running {kind}: {job['name']}")
+            job['func']()
+            logger.info(f"Completed {kind}: {job['name']}")
+        except Exception as e:
+            logger.error(f"Error in {kind} '{job['name']}': {str(e)}")
+        finally:
+            job['is_running'] = False
+    
+    def _launch(self, job):
+        # each run gets its own daemon thread so a long job never holds up the
+        # others or the scheduler loop; is_running keeps runs of a job from overlapping
+        job['is_running'] = True
+        threading.Thread(target=self._run_job, args=(job,), name=job['name'], daemon=True).start()
+    
     def _run_loop(self):
         while self.running:
+            self._wake_event.clear()
             current_time = time.time()
             
-            for job in self.jobs[:]:
-                if job.get('run_once', False):
-                    try:
-                        logger.info(f"Running one-time job: {job['name']}")
-                        job['func']()
-                        logger.info(f"Completed one-time job: {job['name']}")
-                    except Exception as e:
-                        logger.error(f"Error in one-time job '{job['name']}': {str(e)}")
+            # one snapshot per tick: add_job() may append (including run-once
+            # jobs) from other threads while this loop is running
+            jobs = list(self.jobs)
+            
+            # run-once jobs start first and are dropped from the list afterwards
+            for job in jobs:
+                if job['run_once']:
+                    self._launch(job)
                     self.jobs.remove(job)
-                    continue
-                
+            
+            periodic_jobs = [job for job in jobs if not job['run_once']]
+            for job in periodic_jobs:
                 # Check if it's time to run this periodic job
                 time_since_last_run = current_time - job['last_run']
                 
                 if time_since_last_run >= job['interval']:
-                    try:
-                        logger.info(f"Running background job: {job['name']}")
-                        job['func']()
-                        job['last_run'] = current_time
-                        logger.info(f"Completed background job: {job['name']}")
-                    except Exception as e:
-                        logger.error(f"Error in background job '{job['name']}': {str(e)}")
+                    # a failed or skipped run waits for the next interval instead of retrying in a tight loop
+                    job['last_run'] = current_time
+                    if job['is_running']:
+                        logger.warning(f"Skipping run of '{job['name']}', previous run still in progress")
+                        continue
+                    self._launch(job)
             
-            time.sleep(1)
+            # sleep until the next job is due (or until woken by add_job/stop)
+            if periodic_jobs:
+                next_due = min(job['last_run'] + job['interval'] for job in periodic_jobs)
+                self._wake_event.wait(timeout=max(0.0, next_due - time.time()))
+            else:
+                self._wake_event.wait()
 
     def stop(self):
         self.running = False
+        self._wake_event.set()
         if self.thread:
             self.thread.join(timeout=5)
         logger.info("Background job scheduler stopped")